@@ -6,24 +6,151 @@ import numpy as np
 import pandas as pd
 import pickle
 import time
+import collections
 import argparse
 import json
 import os
 import warnings
 from datetime import datetime
+from functools import lru_cache
 import threading
 import queue
 import sys
+import io
+import contextlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import signal
 import psutil
+from sklearn.preprocessing import StandardScaler
+
+try:
+    from numba import njit
+except ImportError:  # Numba é opcional: sem ele usamos NumPy puro
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele usamos o json da biblioteca padrão
+    orjson = None
 
-warnings.filterwarnings('ignore', message='X does not have valid feature names')
 warnings.filterwarnings('ignore', category=UserWarning, module='sklearn')
 
+# Rótulos (em minúsculas) que indicam tráfego normal
+BENIGN_LABELS = frozenset(['benigntraffic', 'benign', 'normal'])
+
+# Tamanho do buffer dos arquivos de saída e frequência de flush (em escritas
+# ou em segundos desde o último flush, o que ocorrer primeiro)
+WRITE_BUFFER_SIZE = 1 << 20
+FLUSH_EVERY = 1000
+FLUSH_INTERVAL = 1.0
+
+@lru_cache(maxsize=4)
+def _timestamp(second):
+    # Timestamp ISO-8601 com resolução de segundo, formatado uma vez por segundo
+    return datetime.fromtimestamp(second).isoformat()
+
+def _dumps(obj):
+    # Uma linha JSON terminada em '\n'; arrays e escalares NumPy (ex.: confidence,
+    # all_probabilities) são serializados sem conversão prévia
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=lambda o: o.tolist()) + '\n').encode('utf-8')
+
+def _jit(**options):
+    # Compila com Numba quando disponível; caso contrário mantém a função Python
+    if njit is None:
+        return lambda func: func
+    return njit(**options)
+
+@_jit(cache=True, fastmath=True)
+def _standardize_kernel(features, mean, scale):
+    for i in range(features.shape[0]):
+        for j in range(features.shape[1]):
+            features[i, j] = (features[i, j] - mean[j]) / scale[j]
+
+@_jit(cache=True, fastmath=True)
+def _classify(probs, benign_mask):
+    idx = probs.argmax()
+    return idx, probs[idx], benign_mask[idx]
+
+def ensure_quantized_model(model_path):
+    # Gera o modelo INT8 a partir do modelo FP32 irmão quando o artefato quantizado não existe
+    model_dir, model_name = os.path.split(model_path)
+    if os.path.exists(model_path) or '_quantized' not in model_name:
+        return
+    
+    fp32_path = os.path.join(model_dir, model_name.replace('_quantized', ''))
+    if not os.path.exists(fp32_path):
+        return
+    
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    print(f"Modelo quantizado não encontrado, quantizando {fp32_path}...")
+    quantize_dynamic(
+        fp32_path,
+        model_path,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        reduce_range=True
+    )
+    
+    fp32_size = os.path.getsize(fp32_path) / (1024 * 1024)
+    int8_size = os.path.getsize(model_path) / (1024 * 1024)
+    print(f"Modelo quantizado salvo em: {model_path}")
+    print(f"Tamanho: {fp32_size:.2f} MB -> {int8_size:.2f} MB ({fp32_size - int8_size:.2f} MB a menos)")
+
 class NetworkAttackDetector:
-    def __init__(self, model_path, metadata_path, confidence_threshold=0.8):
+    def __init__(self, model_path, metadata_path, confidence_threshold=0.8, intra_op_num_threads=None,
+                 batch_size=1, device='cpu'):
+        
+        # Guardados para recriar o detector nos processos do pool
+        self.model_path = model_path
+        self.metadata_path = metadata_path
+        # Tamanho de lote esperado no caminho em lote (1 por padrão: com o
+        # DynamicQuantizeLinear, lotes maiores alteram o resultado de cada amostra)
+        self.batch_size = batch_size
+        
+        ensure_quantized_model(model_path)
         
         print("Carregando modelo...")
-        self.session = ort.InferenceSession(model_path)
+        if device == 'cuda' and 'CUDAExecutionProvider' not in ort.get_available_providers():
+            print("Aviso: CUDAExecutionProvider indisponível, usando CPU")
+            device = 'cpu'
+        self.device = device
+        
+        if device == 'cuda':
+            providers = [
+                ('CUDAExecutionProvider', {
+                    'device_id': 0,
+                    'cudnn_conv_algo_search': 'HEURISTIC',
+                    'arena_extend_strategy': 'kSameAsRequested'
+                }),
+                'CPUExecutionProvider'
+            ]
+        else:
+            providers = ['CPUExecutionProvider']
+        
+        model_path = self._cached_optimized_model(model_path, providers)
+        
+        # Sessões com a dimensão de lote fixa permitem ao ORT especializar formas e
+        # kernels: uma para a predição individual e outra para lotes completos.
+        # A sessão dinâmica atende apenas os pedaços finais entre 2 e batch_size - 1
+        # linhas, por isso não existe com batch_size == 1. Só a sessão dos lotes
+        # completos mantém as threads girando: os pools ociosos das secundárias não
+        # competem pela CPU enquanto outra sessão executa
+        if self.batch_size == 1:
+            self.session = self._create_session(model_path, providers, intra_op_num_threads, 1)
+            self.batch_session = self.session
+            self.dynamic_session = None
+        else:
+            self.session = self._create_session(model_path, providers, intra_op_num_threads, 1,
+                                                allow_spinning=False)
+            self.batch_session = self._create_session(model_path, providers, intra_op_num_threads, self.batch_size)
+            self.dynamic_session = self._create_session(model_path, providers, intra_op_num_threads,
+                                                        allow_spinning=False)
         
         print("Carregando metadados...")
         with open(metadata_path, 'rb') as f:
@@ -33,6 +160,55 @@ class NetworkAttackDetector:
         self.label_encoder = self.metadata['label_encoder']
         self.feature_names = self.metadata['feature_names']
         self.classes = self.metadata['classes']
+        # Índice de cada feature na matriz de entrada do modelo
+        self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        
+        # Parâmetros do StandardScaler em cache para normalizar sem pandas/sklearn,
+        # respeitando with_mean/with_std; outros scalers usam scaler.transform
+        n_features = len(self.feature_names)
+        if isinstance(self.scaler, StandardScaler):
+            mean = self.scaler.mean_ if self.scaler.with_mean else np.zeros(n_features)
+            scale = self.scaler.scale_ if self.scaler.with_std else np.ones(n_features)
+            self._mean = mean.astype(np.float32)
+            self._scale = scale.astype(np.float32)
+        else:
+            self._mean = self._scale = None
+        # Buffer de entrada reutilizado pelas predições individuais
+        self._buf = np.zeros((1, n_features), dtype=np.float32)
+        
+        # Apenas 'probabilities' é consumido; 'logits' não é mais buscado
+        self._output_names = ['probabilities']
+        # IOBinding com buffers persistentes: a predição individual não aloca entrada/saída
+        self._probs_buf = np.zeros((1, len(self.classes)), dtype=np.float32)
+        self._io_binding = self.session.io_binding()
+        # Buffers persistentes do caminho em lote: a matriz de entrada é montada
+        # in-place e entrada/saída são vinculadas sem cópia (memória compartilhada na CPU)
+        self._batch_buf = np.zeros((self.batch_size, n_features), dtype=np.float32)
+        self._batch_probs_buf = np.zeros((self.batch_size, len(self.classes)), dtype=np.float32)
+        self._batch_binding = self.batch_session.io_binding()
+        self._tail_binding = self.dynamic_session.io_binding() if self.dynamic_session is not None else None
+        # Pedaços de uma linha (fluxo com delay) usam a sessão de lote 1 com o próprio binding,
+        # sem mexer em _io_binding, que está ligado a _buf/_probs_buf
+        self._single_binding = self.session.io_binding()
+        if self.device == 'cuda':
+            # Entrada e saída residentes na GPU; apenas as probabilidades voltam para o host
+            self._device_input = ort.OrtValue.ortvalue_from_shape_and_type(
+                self._buf.shape, np.float32, 'cuda', 0)
+            self._device_probs = ort.OrtValue.ortvalue_from_shape_and_type(
+                self._probs_buf.shape, np.float32, 'cuda', 0)
+            self._device_batch_input = ort.OrtValue.ortvalue_from_shape_and_type(
+                self._batch_buf.shape, np.float32, 'cuda', 0)
+            self._device_batch_probs = ort.OrtValue.ortvalue_from_shape_and_type(
+                self._batch_probs_buf.shape, np.float32, 'cuda', 0)
+            self._io_binding.bind_ortvalue_input('features', self._device_input)
+            self._io_binding.bind_ortvalue_output('probabilities', self._device_probs)
+        else:
+            self._io_binding.bind_ortvalue_input('features', ort.OrtValue.ortvalue_from_numpy(self._buf))
+            self._io_binding.bind_ortvalue_output('probabilities', ort.OrtValue.ortvalue_from_numpy(self._probs_buf))
+        # Classes normais calculadas uma única vez, fora do caminho de predição
+        self._benign_classes = frozenset(cls for cls in self.classes if cls.lower() in BENIGN_LABELS)
+        # Máscara por índice de classe usada na classificação ataque/normal
+        self._benign_mask = np.array([cls in self._benign_classes for cls in self.classes])
         
         # Configurar threshold de confiança
         self.confidence_threshold = confidence_threshold
@@ -46,89 +222,314 @@ class NetworkAttackDetector:
         self.attack_detections = 0
         self.attack_types = {}  # Para contagem de tipos de ataque
         self.benign_count = 0   # Contagem de tráfego normal
-        self.inference_times = []
+        # Agregados dos tempos de inferência, atualizados em tempo constante
+        self._t_sum = 0.0
+        self._t_min = float('inf')
+        self._t_max = 0.0
+        self._t_count = 0
+        self.recent_inference_times = collections.deque(maxlen=1024)  # Janela recente
         self.cpu_usage = []
         self.memory_usage = []
         
         # Para rastreamento de confiança
         self.high_confidence_predictions = 0
         self.low_confidence_predictions = 0
+        
+        # Warm-up do modelo
+        self._warmup()
+    
+    def _cached_optimized_model(self, model_path, providers):
+        # Persistir o grafo otimizado na primeira execução e reutilizá-lo depois.
+        # Só as otimizações EXTENDED, portáveis, são serializadas; as de nível ALL
+        # dependem do hardware e são refeitas ao carregar cada sessão. O arquivo é
+        # separado por versão do ORT e por dispositivo
+        optimized_suffix = f'_optimized_ort{ort.__version__}'
+        if self.device != 'cpu':
+            optimized_suffix += f'_{self.device}'
+        optimized_model_path = os.path.splitext(model_path)[0] + optimized_suffix + '.onnx'
+        if (os.path.exists(optimized_model_path)
+                and os.path.getmtime(optimized_model_path) >= os.path.getmtime(model_path)):
+            return optimized_model_path
+        
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        sess_options.optimized_model_filepath = optimized_model_path
+        ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+        return optimized_model_path
+    
+    def _create_session(self, model_path, providers, intra_op_num_threads, batch_size=None, allow_spinning=True):
+        # Configurar ONNX Runtime para throughput em CPU
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = intra_op_num_threads or psutil.cpu_count()  # Pool do MLAS do tamanho da CPU
+        sess_options.inter_op_num_threads = 1  # O grafo é uma cadeia, sem ramos paralelos
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        sess_options.enable_mem_pattern = True
+        sess_options.enable_cpu_mem_arena = True
+        sess_options.add_session_config_entry('session.intra_op.allow_spinning', '1' if allow_spinning else '0')
+        
+        if batch_size is not None:
+            # Fixa o eixo 'batch_size' da entrada, sem precisar reexportar o modelo
+            sess_options.add_free_dimension_override_by_name('batch_size', batch_size)
+        
+        return ort.InferenceSession(
+            model_path,
+            sess_options=sess_options,
+            providers=providers
+        )
+    
+    def _warmup(self, runs=5):
+        # Paga otimização do grafo, alocação da arena e seleção de kernels antes
+        # das medições, em cada uma das sessões (individual, lote e dinâmica).
+        # A dinâmica também é aquecida com 1 linha: os pedaços finais costumam ser pequenos.
+        # Chama a sessão diretamente para não contaminar as estatísticas.
+        print("Aquecendo modelo...")
+        self._buf.fill(0.0)
+        warm_batch = np.zeros((self.batch_size, len(self.feature_names)), dtype=np.float32)
+        for _ in range(runs):
+            self.session.run_with_iobinding(self._io_binding)
+            self.batch_session.run(self._output_names, {'features': warm_batch})
+            if self.dynamic_session is not None:
+                self.dynamic_session.run(self._output_names, {'features': warm_batch})
+                self.dynamic_session.run(self._output_names, {'features': warm_batch[:1]})
+        print("Warm-up concluído!")
+    
+    def standardize(self, features):
+        # Equivalente a scaler.transform, calculado in-place sobre a matriz float32
+        if self._mean is None:
+            try:
+                features[:] = self.scaler.transform(pd.DataFrame(features, columns=self.feature_names))
+            except Exception as e:
+                print(f"Aviso: Erro na normalização, usando dados sem normalização: {e}")
+        elif njit is not None:
+            _standardize_kernel(features, self._mean, self._scale)
+        else:
+            np.subtract(features, self._mean, out=features)
+            np.divide(features, self._scale, out=features)
+        return features
     
     def preprocess_features(self, features_dict):
-        # [manter código existente]
-        feature_values = {}
-        for feature_name in self.feature_names:
-            feature_values[feature_name] = features_dict.get(feature_name, 0.0)
+        # Preenche o buffer pré-alocado (features ausentes ficam em 0.0)
+        buf = self._buf
+        buf.fill(0.0)
+        row = buf[0]
+        feature_index = self._feature_index
+        for feature_name, value in features_dict.items():
+            col = feature_index.get(feature_name)
+            if col is not None:
+                row[col] = value
         
-        features_df = pd.DataFrame([feature_values])
+        return self.standardize(buf)
+    
+    def predict(self, features_dict, verbose=True, include_probs=False, record=True):
+        # Com record=False não há amostragem de CPU/memória nem atualização das
+        # estatísticas (workers do pool: o processo pai registra o resultado)
+        if record:
+            # Capturar métricas de CPU e memória antes da inferência
+            cpu_percent_before = psutil.cpu_percent()
+            memory_info_before = psutil.virtual_memory().percent
         
-        try:
-            features_scaled = self.scaler.transform(features_df)
-        except Exception as e:
-            print(f"Aviso: Erro na normalização, usando dados sem normalização: {e}")
-            features_scaled = features_df.values
+        # Preenche self._buf, já vinculado como entrada do IOBinding
+        self.preprocess_features(features_dict)
         
-        return features_scaled.astype(np.float32)
+        start_time = time.perf_counter_ns()
+        if self.device == 'cuda':
+            self._device_input.update_inplace(self._buf)
+        self.session.run_with_iobinding(self._io_binding)
+        if self.device == 'cuda':
+            self._probs_buf[:] = self._device_probs.numpy()
+        inference_time = (time.perf_counter_ns() - start_time) * 1e-6
+        
+        if record:
+            # Capturar métricas após a inferência
+            cpu_percent_after = psutil.cpu_percent()
+            memory_info_after = psutil.virtual_memory().percent
+            
+            # Armazenar métricas
+            self.cpu_usage.append(max(cpu_percent_before, cpu_percent_after))
+            self.memory_usage.append(max(memory_info_before, memory_info_after))
+        
+        # O buffer de saída é reutilizado: copiar apenas se as probabilidades forem retornadas
+        probabilities = self._probs_buf[0].copy() if include_probs else self._probs_buf[0]
+        return self._build_result(probabilities, inference_time, _timestamp(int(time.time())), include_probs, record)
+    
+    def predict_batch(self, feature_dicts, verbose=True, include_probs=False):
+        # Executa uma única chamada ao ONNX Runtime para todo o lote,
+        # amortizando o custo fixo por chamada entre as amostras.
+        # Atenção: o DynamicQuantizeLinear calcula uma escala por tensor, então
+        # confiança, classe e até o veredito ataque/normal de uma amostra podem
+        # mudar conforme as outras amostras do lote (batch_size=1 evita isso)
+        results = []
+        for start in range(0, len(feature_dicts), self.batch_size):
+            chunk = feature_dicts[start:start + self.batch_size]
+            features = self._batch_buf[:len(chunk)]
+            for row, features_dict in zip(features, chunk):
+                for feature_name, col in self._feature_index.items():
+                    row[col] = features_dict.get(feature_name, 0.0)
+            
+            results.extend(self.predict_prescaled_batch(self.standardize(features), verbose, include_probs))
+        return results
     
-    def predict(self, features_dict, verbose=True):
-        # Capturar métricas de CPU e memória antes da inferência
-        cpu_percent_before = psutil.cpu_percent()
-        memory_info_before = psutil.virtual_memory().percent
+    def predict_prescaled_batch(self, features, verbose=True, include_probs=False, return_results=True,
+                                record=True):
+        # Recebe a matriz (N, F) float32 já na ordem de feature_names e normalizada,
+        # sem nenhuma conversão por amostra. Com return_results=False apenas as
+        # estatísticas são atualizadas e nenhum dicionário é retornado; com
+        # record=False, como em predict, nada é amostrado nem registrado
+        if len(features) == 0:
+            return []
         
-        features = self.preprocess_features(features_dict)
+        # Um único timestamp para todo o lote
+        timestamp = _timestamp(int(time.time()))
+        results = []
         
-        start_time = time.time()
-        ort_inputs = {'features': features}
-        logits, probabilities = self.session.run(None, ort_inputs)
-        inference_time = (time.time() - start_time) * 1000
+        for start in range(0, len(features), self.batch_size):
+            chunk = np.ascontiguousarray(features[start:start + self.batch_size], dtype=np.float32)
+            
+            start_time = time.perf_counter_ns()
+            probabilities = self._run_batch(chunk)
+            # Tempo amortizado por amostra do lote
+            inference_time = (time.perf_counter_ns() - start_time) * 1e-6 / len(chunk)
+            
+            # Classificação vetorizada de todo o lote com máscaras booleanas
+            n = len(chunk)
+            predicted_idx = probabilities.argmax(axis=1)
+            confidences = probabilities[np.arange(n), predicted_idx]
+            is_benign = self._benign_mask[predicted_idx]
+            is_attack = ~is_benign
+            if record:
+                self.record_batch(predicted_idx, confidences, is_attack, inference_time)
+                # Uma amostra de CPU/memória por pedaço (a CPU desde a leitura anterior)
+                self.cpu_usage.append(psutil.cpu_percent())
+                self.memory_usage.append(psutil.virtual_memory().percent)
+            
+            # Dicionários por amostra só são materializados quando retornados
+            if return_results:
+                # O buffer de saída é reutilizado: copiar apenas se as probabilidades forem retornadas
+                rows = probabilities.copy() if include_probs else itertools.repeat(None)
+                for idx, confidence, benign, row in zip(predicted_idx.tolist(), confidences.tolist(),
+                                                         is_benign.tolist(), rows):
+                    result = {
+                        'timestamp': timestamp,
+                        'predicted_class': self.classes[idx],
+                        'confidence': confidence,
+                        'is_attack': not benign,
+                        'is_benign': benign,
+                        'inference_time_ms': inference_time
+                    }
+                    if include_probs:
+                        result['all_probabilities'] = row
+                    results.append(result)
         
-        # Capturar métricas após a inferência
-        cpu_percent_after = psutil.cpu_percent()
-        memory_info_after = psutil.virtual_memory().percent
+        return results
+    
+    def _run_batch(self, chunk):
+        # Executa um pedaço com até batch_size linhas e retorna as probabilidades no host.
+        # Pedaços completos e de uma linha usam as sessões de forma fixa; os demais, a dinâmica
+        if len(chunk) == self.batch_size:
+            session, binding = self.batch_session, self._batch_binding
+        elif len(chunk) == 1:
+            session, binding = self.session, self._single_binding
+        else:
+            session, binding = self.dynamic_session, self._tail_binding
         
-        # Armazenar métricas
-        self.cpu_usage.append(max(cpu_percent_before, cpu_percent_after))
-        self.memory_usage.append(max(memory_info_before, memory_info_after))
+        if self.device == 'cuda':
+            if len(chunk) == self.batch_size:
+                self._device_batch_input.update_inplace(chunk)
+                binding.bind_ortvalue_input('features', self._device_batch_input)
+                binding.bind_ortvalue_output('probabilities', self._device_batch_probs)
+            else:
+                binding.bind_ortvalue_input('features', ort.OrtValue.ortvalue_from_numpy(chunk, 'cuda', 0))
+                binding.bind_output('probabilities', 'cuda', 0)
+            session.run_with_iobinding(binding)
+            # Só a matriz de probabilidades (N x C) é copiada da GPU
+            return binding.get_outputs()[0].numpy()
         
-        predicted_class_idx = np.argmax(probabilities[0])
+        # OrtValues apenas envolvem a memória dos arrays: nenhuma cópia de entrada/saída
+        probabilities = self._batch_probs_buf[:len(chunk)]
+        binding.bind_ortvalue_input('features', ort.OrtValue.ortvalue_from_numpy(chunk))
+        binding.bind_ortvalue_output('probabilities', ort.OrtValue.ortvalue_from_numpy(probabilities))
+        session.run_with_iobinding(binding)
+        return probabilities
+    
+    def _build_result(self, probabilities, inference_time, timestamp, include_probs=False, record=True):
+        predicted_class_idx, confidence, is_benign = _classify(probabilities, self._benign_mask)
         predicted_class = self.classes[predicted_class_idx]
-        confidence = probabilities[0][predicted_class_idx]
-        
-        self.total_predictions += 1
-        self.inference_times.append(inference_time)
 
         # Simplificar a classificação para apenas "ataque" ou "normal"
-        is_benign = predicted_class.lower() in ['benigntraffic', 'benign', 'normal']
+        is_benign = bool(is_benign)
         is_attack = not is_benign
         
-        # Atualizar estatísticas
-        if is_attack:
+        result = {
+            'timestamp': timestamp,
+            'predicted_class': predicted_class,
+            'confidence': confidence,
+            'is_attack': is_attack,
+            'is_benign': is_benign,
+            'inference_time_ms': inference_time
+        }
+        if include_probs:
+            # Vetor NumPy sem conversão para lista de floats Python
+            result['all_probabilities'] = probabilities
+        if record:
+            self.record_result(result)
+        return result
+    
+    def _record_inference_time(self, inference_time, count=1):
+        self._t_sum += inference_time * count
+        self._t_count += count
+        if inference_time < self._t_min:
+            self._t_min = inference_time
+        if inference_time > self._t_max:
+            self._t_max = inference_time
+        recent = self.recent_inference_times
+        recent.extend(itertools.repeat(inference_time, min(count, recent.maxlen)))
+    
+    def record_batch(self, predicted_idx, confidences, is_attack, inference_time):
+        # Versão vetorizada de record_result para um lote inteiro
+        n = len(predicted_idx)
+        self.total_predictions += n
+        self._record_inference_time(inference_time, n)
+        
+        n_attacks = int(np.count_nonzero(is_attack))
+        self.attack_detections += n_attacks
+        self.benign_count += n - n_attacks
+        if n_attacks:
+            # Contabilizar tipos de ataque com um único bincount
+            counts = np.bincount(predicted_idx[is_attack], minlength=len(self.classes))
+            for idx in np.flatnonzero(counts).tolist():
+                predicted_class = self.classes[idx]
+                self.attack_types[predicted_class] = self.attack_types.get(predicted_class, 0) + int(counts[idx])
+        
+        n_high = int(np.count_nonzero(confidences >= self.confidence_threshold))
+        self.high_confidence_predictions += n_high
+        self.low_confidence_predictions += n - n_high
+    
+    def record_result(self, result):
+        # Atualizar estatísticas (também usado para resultados vindos dos workers)
+        self.total_predictions += 1
+        self._record_inference_time(result['inference_time_ms'])
+        
+        if result['is_attack']:
             self.attack_detections += 1
             # Contabilizar tipo de ataque
+            predicted_class = result['predicted_class']
             self.attack_types[predicted_class] = self.attack_types.get(predicted_class, 0) + 1
         else:
             self.benign_count += 1
             
         # Contabilizar confiança
-        if confidence >= self.confidence_threshold:
+        if result['confidence'] >= self.confidence_threshold:
             self.high_confidence_predictions += 1
         else:
             self.low_confidence_predictions += 1
-        
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'predicted_class': predicted_class,
-            'confidence': float(confidence),
-            'is_attack': is_attack,
-            'is_benign': is_benign,
-            'inference_time_ms': inference_time,
-            'all_probabilities': probabilities[0].tolist()
-        }
     
     def get_statistics(self):
-        if not self.inference_times:
+        if not self._t_count:
             return {}
         
+        avg_inference_time = self._t_sum / self._t_count
+        
         return {
             'total_predictions': self.total_predictions,
             'attack_detections': self.attack_detections,
@@ -138,10 +539,11 @@ class NetworkAttackDetector:
             'low_confidence_predictions': self.low_confidence_predictions,
             'high_confidence_rate': self.high_confidence_predictions / self.total_predictions if self.total_predictions > 0 else 0,
             'attack_types': self.attack_types,
-            'avg_inference_time_ms': np.mean(self.inference_times),
-            'max_inference_time_ms': np.max(self.inference_times),
-            'min_inference_time_ms': np.min(self.inference_times),
-            'throughput_per_second': 1000 / np.mean(self.inference_times) if self.inference_times else 0,
+            'avg_inference_time_ms': avg_inference_time,
+            'max_inference_time_ms': self._t_max,
+            'min_inference_time_ms': self._t_min,
+            'recent_avg_inference_time_ms': sum(self.recent_inference_times) / len(self.recent_inference_times),
+            'throughput_per_second': 1000 / avg_inference_time if avg_inference_time > 0 else 0,
             'avg_cpu_usage': np.mean(self.cpu_usage) if self.cpu_usage else 0,
             'max_cpu_usage': np.max(self.cpu_usage) if self.cpu_usage else 0,
             'avg_memory_usage': np.mean(self.memory_usage) if self.memory_usage else 0,
@@ -149,88 +551,160 @@ class NetworkAttackDetector:
             'confidence_threshold': self.confidence_threshold
         }
 
+# Detector de cada processo do pool de workers
+_worker_detector = None
+
+# Lote de features já normalizadas (layout SoA) com rótulos reais opcionais
+FeatureBatch = collections.namedtuple('FeatureBatch', ['features', 'true_labels'])
+
+def _init_worker(model_path, metadata_path, confidence_threshold, batch_size, device):
+    global _worker_detector
+    # Uma thread por sessão: o paralelismo vem do número de processos
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_detector = NetworkAttackDetector(
+            model_path, metadata_path, confidence_threshold, intra_op_num_threads=1,
+            batch_size=batch_size, device=device
+        )
+
+# Os workers não amostram CPU/memória nem atualizam estatísticas: o processo
+# pai registra cada resultado em collect_results
+def _predict_in_worker(features_dict):
+    return _worker_detector.predict(features_dict, include_probs=True, record=False)
+
+def _predict_prescaled_in_worker(features):
+    return _worker_detector.predict_prescaled_batch(features, include_probs=True, record=False)
+
 class RealTimeMonitor:
-    def __init__(self, detector, log_file='attack_log.json', result_file=None):
+    def __init__(self, detector, log_file='attack_log.json', result_file=None, batch_size=1, workers=0):
         self.detector = detector
         self.log_file = log_file
         self.result_file = result_file
-        self.data_queue = queue.Queue()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.executor = None
+        # Filas FIFO em C, sem a contabilidade de task_done/join; o fim do fluxo
+        # é sinalizado por um sentinela None
+        self.pending = queue.SimpleQueue()
+        self.data_queue = queue.SimpleQueue()
         self.running = False
         self.results = []  
         
         # Para calcular acurácia caso tenhamos rótulos reais
         self.true_labels = []
         self.predicted_labels = [] 
+        
+        # Arquivos mantidos abertos durante o monitoramento, abertos na primeira escrita
+        self._log_fh = None
+        self._res_fh = None
+        # save_result é chamado pelo produtor e pelo consumidor: a abertura é protegida
+        self._res_lock = threading.Lock()
+        self._writes = 0
+        self._last_flush = time.monotonic()
+        atexit.register(self.close_files)
+    
+    def _count_write(self):
+        self._writes += 1
+        # Com o fluxo cadenciado (--delay) o limite de escritas demoraria minutos
+        if self._writes % FLUSH_EVERY == 0 or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush_files()
+    
+    def flush_files(self):
+        self._last_flush = time.monotonic()
+        for fh in (self._log_fh, self._res_fh):
+            if fh is not None:
+                fh.flush()
+    
+    def close_files(self):
+        log_fh, self._log_fh = self._log_fh, None
+        res_fh, self._res_fh = self._res_fh, None
+        for fh in (log_fh, res_fh):
+            if fh is not None:
+                fh.close()
     
     def log_detection(self, result):
         
-        with open(self.log_file, 'a') as f:
-            f.write(json.dumps(result) + '\n')
+        if self._log_fh is None:
+            self._log_fh = open(self.log_file, 'ab', buffering=WRITE_BUFFER_SIZE)
+        self._log_fh.write(_dumps(result))
+        self._count_write()
     
     def save_result(self, message):
         
         if self.result_file:
-            with open(self.result_file, 'a', encoding='utf-8') as f:
-                f.write(message + '\n')
+            if self._res_fh is None:
+                with self._res_lock:
+                    if self._res_fh is None:
+                        self._res_fh = open(self.result_file, 'ab', buffering=WRITE_BUFFER_SIZE)
+            # Uma única escrita por linha para não intercalar mensagens entre threads
+            self._res_fh.write(message.encode('utf-8') + b'\n')
+            self._count_write()
         else:
             print(message)
     
     def save_all_results(self):
+        # Descarregar e fechar os arquivos abertos antes de reescrever o resultado
+        self.close_files()
         if self.result_file and self.results:
+            # Uma única conversão para DataFrame; o restante usa máscaras vetorizadas
+            df = pd.DataFrame(self.results)
+            total = len(df)
+            is_attack = df['is_attack'].to_numpy(dtype=bool)
+            confidences = df['confidence'].to_numpy(dtype=np.float64)
+            inference_times = df['inference_time_ms'].to_numpy(dtype=np.float64)
+            high_confidence = confidences >= self.detector.confidence_threshold
+            
+            n_attacks = int(is_attack.sum())
+            n_benign = total - n_attacks
+            n_high_confidence = int(high_confidence.sum())
+            n_low_confidence = total - n_high_confidence
+            attack_types = df.loc[is_attack, 'predicted_class'].value_counts()
+            
+            # Rótulos reais alinhados a cada resultado (antes de qualquer ordenação)
+            has_true_labels = bool(self.true_labels) and len(self.true_labels) == total
+            if has_true_labels:
+                true_labels = np.asarray(self.true_labels, dtype=np.int64)
+                predicted_labels = is_attack.astype(np.int64)
+                df['correct'] = true_labels == predicted_labels
+            
             with open(self.result_file, 'w', encoding='utf-8') as f:
                 f.write("=== RESULTADOS DA ANÁLISE ===\n")
                 f.write(f"Data/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total de amostras processadas: {len(self.results)}\n")
+                f.write(f"Total de amostras processadas: {total}\n")
                 f.write(f"Threshold de confiança: {self.detector.confidence_threshold}\n\n")
                 
                 # Estatísticas básicas
-                attacks = [r for r in self.results if r['is_attack']]
-                benign = [r for r in self.results if not r['is_attack']]
-                
-                f.write(f"Ataques detectados: {len(attacks)}\n")
-                f.write(f"Tráfego normal: {len(benign)}\n")
-                f.write(f"Taxa de ataques: {len(attacks)/len(self.results)*100:.2f}%\n\n")
+                f.write(f"Ataques detectados: {n_attacks}\n")
+                f.write(f"Tráfego normal: {n_benign}\n")
+                f.write(f"Taxa de ataques: {n_attacks/total*100:.2f}%\n\n")
                 
                 # Estatísticas de confiança
-                confidences = [r['confidence'] for r in self.results]
-                low_confidence = [r for r in self.results if r['confidence'] < self.detector.confidence_threshold]
-                high_confidence = [r for r in self.results if r['confidence'] >= self.detector.confidence_threshold]
-                
                 f.write("=== ESTATÍSTICAS DE CONFIANÇA ===\n")
-                f.write(f"Predições com alta confiança: {len(high_confidence)} ({len(high_confidence)/len(self.results)*100:.2f}%)\n")
-                f.write(f"Predições com baixa confiança: {len(low_confidence)} ({len(low_confidence)/len(self.results)*100:.2f}%)\n")
-                f.write(f"Confiança média: {np.mean(confidences):.4f}\n")
+                f.write(f"Predições com alta confiança: {n_high_confidence} ({n_high_confidence/total*100:.2f}%)\n")
+                f.write(f"Predições com baixa confiança: {n_low_confidence} ({n_low_confidence/total*100:.2f}%)\n")
+                f.write(f"Confiança média: {confidences.mean():.4f}\n")
                 f.write(f"Confiança mediana: {np.median(confidences):.4f}\n")
-                f.write(f"Confiança mínima: {np.min(confidences):.4f}\n")
-                f.write(f"Confiança máxima: {np.max(confidences):.4f}\n")
-                f.write(f"Desvio padrão da confiança: {np.std(confidences):.4f}\n\n")
+                f.write(f"Confiança mínima: {confidences.min():.4f}\n")
+                f.write(f"Confiança máxima: {confidences.max():.4f}\n")
+                f.write(f"Desvio padrão da confiança: {confidences.std():.4f}\n\n")
                 
                 # Lista de todos os ataques e suas incidências
-                attack_types = {}
-                for result in self.results:
-                    if result['is_attack']:
-                        attack_type = result['predicted_class']
-                        attack_types[attack_type] = attack_types.get(attack_type, 0) + 1
-                    
                 f.write("=== INCIDÊNCIA DE ATAQUES ===\n")
-                if attack_types:
-                    for attack_type, count in sorted(attack_types.items(), key=lambda x: x[1], reverse=True):
-                        f.write(f"{attack_type}: {count} ocorrências ({count/len(self.results)*100:.2f}%)\n")
+                if not attack_types.empty:
+                    for attack_type, count in attack_types.items():
+                        f.write(f"{attack_type}: {count} ocorrências ({count/total*100:.2f}%)\n")
                 else:
                     f.write("Nenhum ataque detectado\n")
-                f.write(f"Tráfego Normal: {len(benign)} ocorrências ({len(benign)/len(self.results)*100:.2f}%)\n\n")
+                f.write(f"Tráfego Normal: {n_benign} ocorrências ({n_benign/total*100:.2f}%)\n\n")
                 
                 # Métricas de performance
-                inference_times = [r['inference_time_ms'] for r in self.results]
-                
                 f.write("=== MÉTRICAS DE DESEMPENHO ===\n")
-                f.write(f"Tempo médio de inferência: {np.mean(inference_times):.2f} ms\n")
-                f.write(f"Tempo máximo de inferência: {np.max(inference_times):.2f} ms\n")
-                f.write(f"Tempo mínimo de inferência: {np.min(inference_times):.2f} ms\n")
-                f.write(f"Desvio padrão da inferência: {np.std(inference_times):.2f} ms\n")
+                f.write(f"Tempo médio de inferência: {inference_times.mean():.2f} ms\n")
+                f.write(f"Tempo máximo de inferência: {inference_times.max():.2f} ms\n")
+                f.write(f"Tempo mínimo de inferência: {inference_times.min():.2f} ms\n")
+                f.write(f"Desvio padrão da inferência: {inference_times.std():.2f} ms\n")
                 f.write(f"Percentil 95 (P95) da inferência: {np.percentile(inference_times, 95):.2f} ms\n")
                 f.write(f"Percentil 99 (P99) da inferência: {np.percentile(inference_times, 99):.2f} ms\n")
-                f.write(f"Throughput: {1000 / np.mean(inference_times):.2f} predições/segundo\n")
+                f.write(f"Throughput: {1000 / inference_times.mean():.2f} predições/segundo\n")
                 
                 # Adicionar métricas de CPU e memória
                 stats = self.detector.get_statistics()
@@ -240,18 +714,14 @@ class RealTimeMonitor:
                 f.write(f"Uso máximo de memória: {stats.get('max_memory_usage', 0):.2f}%\n\n")
                 
                 # Adicionar métricas de acurácia se tivermos rótulos reais
-                if self.true_labels and len(self.true_labels) == len(self.results):
+                if has_true_labels:
                     from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
                     
-                    predicted_labels = []
-                    for result in self.results:
-                        predicted_labels.append(1 if result['is_attack'] else 0)
-                    
                     f.write("=== MÉTRICAS DE ACURÁCIA ===\n")
-                    accuracy = accuracy_score(self.true_labels, predicted_labels)
-                    precision = precision_score(self.true_labels, predicted_labels, zero_division=0)
-                    recall = recall_score(self.true_labels, predicted_labels, zero_division=0)
-                    f1 = f1_score(self.true_labels, predicted_labels, zero_division=0)
+                    accuracy = accuracy_score(true_labels, predicted_labels)
+                    precision = precision_score(true_labels, predicted_labels, zero_division=0)
+                    recall = recall_score(true_labels, predicted_labels, zero_division=0)
+                    f1 = f1_score(true_labels, predicted_labels, zero_division=0)
                     
                     f.write(f"Acurácia: {accuracy:.4f}\n")
                     f.write(f"Precisão: {precision:.4f}\n")
@@ -259,7 +729,7 @@ class RealTimeMonitor:
                     f.write(f"F1-Score: {f1:.4f}\n")
                     
                     # Matriz de confusão
-                    cm = confusion_matrix(self.true_labels, predicted_labels)
+                    cm = confusion_matrix(true_labels, predicted_labels, labels=[0, 1])
                     f.write("\nMatriz de Confusão:\n")
                     f.write("    | Normal | Ataque\n")
                     f.write("----|--------|-------\n")
@@ -267,136 +737,272 @@ class RealTimeMonitor:
                     f.write(f"Ataque  | {cm[1][0]:6d} | {cm[1][1]:6d}\n\n")
                     
                     # Calcular acurácia por amostra
-                    correct_predictions = sum(1 for true, pred in zip(self.true_labels, predicted_labels) if true == pred)
-                    incorrect_predictions = sum(1 for true, pred in zip(self.true_labels, predicted_labels) if true != pred)
+                    correct_predictions = int(df['correct'].sum())
+                    incorrect_predictions = total - correct_predictions
                     
-                    f.write(f"Predições corretas: {correct_predictions} ({correct_predictions/len(self.results)*100:.2f}%)\n")
-                    f.write(f"Predições incorretas: {incorrect_predictions} ({incorrect_predictions/len(self.results)*100:.2f}%)\n\n")
+                    f.write(f"Predições corretas: {correct_predictions} ({correct_predictions/total*100:.2f}%)\n")
+                    f.write(f"Predições incorretas: {incorrect_predictions} ({incorrect_predictions/total*100:.2f}%)\n\n")
                 
-                    # Detalhes de todas as detecções (ataques e tráfego normal)
+                # Detalhes de todas as detecções (ataques e tráfego normal)
                 f.write("=== DETALHES DE TODAS AS DETECÇÕES ===\n")
                 
-                # Ordenar todas as detecções por confiança
-                all_results_sorted = sorted(self.results, key=lambda x: x['confidence'], reverse=True)
+                # Ordenar todas as detecções por confiança, limitando a 1000 para não
+                # tornar o arquivo muito grande
+                all_results_sorted = df.sort_values('confidence', ascending=False, kind='stable')
+                details = all_results_sorted.head(1000).copy()
+                details_attack = details['is_attack'].to_numpy(dtype=bool)
+                details['tipo'] = np.where(details_attack, "ATAQUE", "TRÁFEGO NORMAL")
+                columns = ['tipo', 'predicted_class', 'timestamp', 'confidence', 'inference_time_ms']
+                header = ['Tipo', 'Classe', 'Timestamp', 'Confiança', 'Tempo (ms)']
                 
-                if all_results_sorted:
-                    for i, result in enumerate(all_results_sorted, 1):
-                        detection_type = "ATAQUE" if result['is_attack'] else "TRÁFEGO NORMAL"
-                        class_name = result['predicted_class']
-                        
-                        f.write(f"\n[{i}] {detection_type}: {class_name}\n")
-                        f.write(f"    Timestamp: {result['timestamp']}\n")
-                        f.write(f"    Confiança: {result['confidence']:.4f}\n")
-                        f.write(f"    Tempo de inferência: {result['inference_time_ms']:.2f} ms\n")
-                        
-                        # Se temos rótulos verdadeiros, mostrar se a predição foi correta
-                        if self.true_labels and i-1 < len(self.true_labels):
-                            true_value = self.true_labels[i-1]  # 1 = ataque, 0 = normal
-                            pred_value = 1 if result['is_attack'] else 0
-                            is_correct = (true_value == pred_value)
-                            f.write(f"    Predição correta: {'✓ SIM' if is_correct else '✗ NÃO'}\n")
-                            
-                        # Mostrar as top 3 classes com maior probabilidade
-                        top_classes = sorted(
-                            zip(self.detector.classes, result['all_probabilities']), 
-                            key=lambda x: x[1], 
-                            reverse=True
-                        )[:3]
-                        
-                        f.write("    Top 3 classes mais prováveis:\n")
-                        for cls_name, prob in top_classes:
-                            f.write(f"      - {cls_name}: {prob:.4f}\n")
-                        
-                        f.write("    " + "-"*40 + "\n")
-                        
-                        # Limitar o número de detalhes exibidos para não tornar o arquivo muito grande
-                        if i >= 1000:  # Limitar a 1000 resultados detalhados
-                            f.write(f"\n... mais {len(all_results_sorted) - 1000} detecções omitidas ...\n")
-                            break
-                else:
-                    f.write("Nenhuma detecção registrada durante a análise\n\n")
+                # Se temos rótulos verdadeiros, mostrar se a predição foi correta
+                if has_true_labels:
+                    details_correct = details['correct'].to_numpy(dtype=bool)
+                    details['predicao_correta'] = np.where(details_correct, '✓ SIM', '✗ NÃO')
+                    columns.append('predicao_correta')
+                    header.append('Correta')
+                
+                # Top 3 classes com maior probabilidade, calculadas sobre a matriz inteira
+                # (all_probabilities é opcional: só quando todas as linhas o trazem)
+                if 'all_probabilities' in details and details['all_probabilities'].notna().all():
+                    probabilities = np.stack(details['all_probabilities'].to_numpy())
+                    top_idx = np.argsort(-probabilities, axis=1, kind='stable')[:, :3]
+                    top_probs = np.take_along_axis(probabilities, top_idx, axis=1)
+                    top_names = np.asarray(self.detector.classes)[top_idx]
+                    details['top_3_classes'] = [
+                        ', '.join(f"{name}: {prob:.4f}" for name, prob in zip(names, probs))
+                        for names, probs in zip(top_names, top_probs)
+                    ]
+                    columns.append('top_3_classes')
+                    header.append('Top 3 classes mais prováveis')
+                
+                details.index = np.arange(1, len(details) + 1)
+                details.to_string(
+                    buf=f,
+                    columns=columns,
+                    header=header,
+                    float_format=lambda x: f"{x:.4f}",
+                    formatters={'inference_time_ms': lambda x: f"{x:.2f}"}
+                )
+                f.write("\n")
+                if total > len(details):
+                    f.write(f"\n... mais {total - len(details)} detecções omitidas ...\n")
                     
                 # Manter seções específicas para métricas gerais
                 f.write("\n=== RESUMO DE ATAQUES ===\n")
-                if attacks:
-                    f.write(f"Total de ataques: {len(attacks)}\n")
-                    attack_confidence = [r['confidence'] for r in attacks]
-                    f.write(f"Confiança média de ataques: {np.mean(attack_confidence):.4f}\n")
-                    f.write(f"Confiança mínima de ataques: {np.min(attack_confidence):.4f}\n")
-                    f.write(f"Confiança máxima de ataques: {np.max(attack_confidence):.4f}\n")
+                if n_attacks:
+                    attack_confidence = confidences[is_attack]
+                    f.write(f"Total de ataques: {n_attacks}\n")
+                    f.write(f"Confiança média de ataques: {attack_confidence.mean():.4f}\n")
+                    f.write(f"Confiança mínima de ataques: {attack_confidence.min():.4f}\n")
+                    f.write(f"Confiança máxima de ataques: {attack_confidence.max():.4f}\n")
                 else:
                     f.write("Nenhum ataque detectado\n")
                 
                 f.write("\n=== RESUMO DE TRÁFEGO NORMAL ===\n")
-                if benign:
-                    f.write(f"Total de tráfego normal: {len(benign)}\n")
-                    benign_confidence = [r['confidence'] for r in benign]
-                    f.write(f"Confiança média de tráfego normal: {np.mean(benign_confidence):.4f}\n")
-                    f.write(f"Confiança mínima de tráfego normal: {np.min(benign_confidence):.4f}\n")
-                    f.write(f"Confiança máxima de tráfego normal: {np.max(benign_confidence):.4f}\n")
+                if n_benign:
+                    benign_confidence = confidences[~is_attack]
+                    f.write(f"Total de tráfego normal: {n_benign}\n")
+                    f.write(f"Confiança média de tráfego normal: {benign_confidence.mean():.4f}\n")
+                    f.write(f"Confiança mínima de tráfego normal: {benign_confidence.min():.4f}\n")
+                    f.write(f"Confiança máxima de tráfego normal: {benign_confidence.max():.4f}\n")
                 else:
                     f.write("Nenhum tráfego normal detectado\n")
                     
                 # Resumo das Top 10 detecções com maior confiança
                 f.write("\n=== TOP 10 DETECÇÕES POR CONFIANÇA ===\n")
-                top_confidence = sorted(self.results, key=lambda x: x['confidence'], reverse=True)[:10]
+                top_confidence = all_results_sorted.head(10)
                 
-                for i, result in enumerate(top_confidence, 1):
-                    detection_type = "ATAQUE" if result['is_attack'] else "NORMAL"
-                    f.write(f"{i}. [{detection_type}] {result['predicted_class']} (Confiança: {result['confidence']:.4f})\n")
+                for i, result in enumerate(top_confidence.itertuples(index=False), 1):
+                    detection_type = "ATAQUE" if result.is_attack else "NORMAL"
+                    f.write(f"{i}. [{detection_type}] {result.predicted_class} (Confiança: {result.confidence:.4f})\n")
                 
                 # Resumo das 10 detecções com inferência mais rápida/lenta
                 f.write("\n=== 10 INFERÊNCIAS MAIS RÁPIDAS ===\n")
-                fastest = sorted(self.results, key=lambda x: x['inference_time_ms'])[:10]
+                fastest = df.nsmallest(10, 'inference_time_ms')
                 
-                for i, result in enumerate(fastest, 1):
-                    detection_type = "ATAQUE" if result['is_attack'] else "NORMAL" 
-                    f.write(f"{i}. [{detection_type}] {result['inference_time_ms']:.2f} ms - {result['predicted_class']}\n")
+                for i, result in enumerate(fastest.itertuples(index=False), 1):
+                    detection_type = "ATAQUE" if result.is_attack else "NORMAL" 
+                    f.write(f"{i}. [{detection_type}] {result.inference_time_ms:.2f} ms - {result.predicted_class}\n")
                 
                 f.write("\n=== 10 INFERÊNCIAS MAIS LENTAS ===\n")
-                slowest = sorted(self.results, key=lambda x: x['inference_time_ms'], reverse=True)[:10]
+                slowest = df.nlargest(10, 'inference_time_ms')
                 
-                for i, result in enumerate(slowest, 1):
-                    detection_type = "ATAQUE" if result['is_attack'] else "NORMAL"
-                    f.write(f"{i}. [{detection_type}] {result['inference_time_ms']:.2f} ms - {result['predicted_class']}\n")
+                for i, result in enumerate(slowest.itertuples(index=False), 1):
+                    detection_type = "ATAQUE" if result.is_attack else "NORMAL"
+                    f.write(f"{i}. [{detection_type}] {result.inference_time_ms:.2f} ms - {result.predicted_class}\n")
+    
+    def _drain_queue(self):
+        # Bloqueia apenas pelo primeiro item e depois coleta, sem bloquear,
+        # o que já estiver na fila até completar o lote.
+        # Retorna (itens, fim_do_fluxo)
+        items = []
+        n_samples = 0
+        data = self.data_queue.get(timeout=1)
+        while True:
+            if data is None:
+                return items, True
+            items.append(data)
+            if isinstance(data, FeatureBatch):
+                n_samples += len(data.features)
+            elif isinstance(data, list):
+                n_samples += len(data)
+            else:
+                n_samples += 1
+            if n_samples >= self.batch_size:
+                break
+            try:
+                data = self.data_queue.get_nowait()
+            except queue.Empty:
+                break
+        return items, False
     
     def process_data_stream(self):
-        while self.running:
+        end_of_stream = False
+        while self.running and not end_of_stream:
             try:
-                # Se temos uma tupla (features, true_label), salvar o rótulo verdadeiro
-                data = self.data_queue.get(timeout=1)
-                
-                if isinstance(data, tuple) and len(data) == 2:
-                    features_dict, true_label = data
-                    self.true_labels.append(true_label)
-                else:
-                    features_dict = data
+                items, end_of_stream = self._drain_queue()
+            except queue.Empty:
+                continue
+            
+            try:
+                samples = []  # Pares (features_dict, rótulo real ou None)
+                for data in items:
+                    if isinstance(data, FeatureBatch):
+                        # Processar antes as amostras em dicionário para manter a ordem
+                        self._process_samples(samples)
+                        samples = []
+                        
+                        results = self.detector.predict_prescaled_batch(data.features, include_probs=True)
+                        # Rótulos registrados só após o lote gerar resultados
+                        if data.true_labels is not None:
+                            self.true_labels.extend(data.true_labels)
+                        for result in results:
+                            self.handle_result(result)
+                        continue
+                    
+                    for sample in (data if isinstance(data, list) else [data]):
+                        # Se temos uma tupla (features, true_label), guardar o rótulo verdadeiro
+                        if isinstance(sample, tuple) and len(sample) == 2:
+                            samples.append(sample)
+                        else:
+                            samples.append((sample, None))
                 
-                result = self.detector.predict(features_dict)
-                self.results.append(result)
+                self._process_samples(samples)
                 
-                # Simplificar mensagens para classificação binária
-                if result['is_attack']:
-                    message = f"🚨 ATAQUE: {result['predicted_class']} (Confiança: {result['confidence']:.3f})"
-                    self.save_result(message)
-                    self.log_detection(result)
+            except Exception as e:
+                error_msg = f"Erro no processamento: {e}"
+                self.save_result(error_msg)
+    
+    def _process_samples(self, samples):
+        # Uma chamada de predict_batch por lote de até batch_size amostras: uma falha
+        # não deixa estatísticas parciais. Um lote com erro é refeito amostra a amostra,
+        # perdendo apenas as amostras inválidas
+        step = self.detector.batch_size
+        for start in range(0, len(samples), step):
+            chunk = samples[start:start + step]
+            try:
+                results = self.detector.predict_batch(
+                    [features_dict for features_dict, _ in chunk], include_probs=True
+                )
+            except Exception as e:
+                if len(chunk) == 1:
+                    error_msg = f"Erro no processamento: {e}"
+                    self.save_result(error_msg)
                 else:
-                    message = f"✅ TRÁFEGO NORMAL (Confiança: {result['confidence']:.3f})"
-                    self.save_result(message)
-                
-                self.data_queue.task_done()
-                
+                    for sample in chunk:
+                        self._process_samples([sample])
+                continue
+            
+            for (_, true_label), result in zip(chunk, results):
+                # Rótulo real apenas para amostras que geraram resultado
+                if true_label is not None:
+                    self.true_labels.append(true_label)
+                self.handle_result(result)
+    
+    def handle_result(self, result):
+        self.results.append(result)
+        
+        # Simplificar mensagens para classificação binária
+        if result['is_attack']:
+            message = f"🚨 ATAQUE: {result['predicted_class']} (Confiança: {result['confidence']:.3f})"
+            self.save_result(message)
+            self.log_detection(result)
+        else:
+            message = f"✅ TRÁFEGO NORMAL (Confiança: {result['confidence']:.3f})"
+            self.save_result(message)
+    
+    def dispatch_data_stream(self):
+        # Envia cada amostra para o pool de processos sem esperar o resultado
+        while self.running:
+            try:
+                data = self.data_queue.get(timeout=1)
             except queue.Empty:
                 continue
+            
+            if data is None:
+                # Repassa o fim do fluxo para o coletor
+                self.pending.put(None)
+                break
+            
+            if isinstance(data, FeatureBatch):
+                # O lote SoA vai inteiro para um único worker
+                future = self.executor.submit(_predict_prescaled_in_worker, data.features)
+                self.pending.put((future, data.true_labels))
+                continue
+            
+            for sample in (data if isinstance(data, list) else [data]):
+                if isinstance(sample, tuple) and len(sample) == 2:
+                    features_dict, true_label = sample
+                    true_labels = [true_label]
+                else:
+                    features_dict, true_labels = sample, None
+                future = self.executor.submit(_predict_in_worker, features_dict)
+                self.pending.put((future, true_labels))
+    
+    def collect_results(self):
+        # Consome os futures na ordem de envio, mantendo a ordem dos resultados
+        while True:
+            entry = self.pending.get()
+            if entry is None:
+                break
+            
+            future, true_labels = entry
+            try:
+                results = future.result()
+                if isinstance(results, dict):
+                    results = [results]
+                self.detector.cpu_usage.append(psutil.cpu_percent())
+                self.detector.memory_usage.append(psutil.virtual_memory().percent)
+                if true_labels is not None:
+                    self.true_labels.extend(true_labels)
+                for result in results:
+                    self.detector.record_result(result)
+                    self.handle_result(result)
             except Exception as e:
                 error_msg = f"Erro no processamento: {e}"
                 self.save_result(error_msg)
- 
     
     def start_monitoring(self):
-        
+        # Retorna a última thread do pipeline: ela termina depois que todas as
+        # amostras enfileiradas antes de end_of_stream() forem processadas
         self.running = True
-        monitor_thread = threading.Thread(target=self.process_data_stream)
+        if self.workers > 0:
+            # Um processo por worker, cada um com sua própria InferenceSession
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.detector.model_path, self.detector.metadata_path,
+                          self.detector.confidence_threshold, self.detector.batch_size,
+                          self.detector.device)
+            )
+            dispatch_thread = threading.Thread(target=self.dispatch_data_stream)
+            dispatch_thread.daemon = True
+            dispatch_thread.start()
+            monitor_thread = threading.Thread(target=self.collect_results)
+        else:
+            monitor_thread = threading.Thread(target=self.process_data_stream)
         monitor_thread.daemon = True
         monitor_thread.start()
         
@@ -405,11 +1011,28 @@ class RealTimeMonitor:
     
     def stop_monitoring(self):
         self.running = False
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.pending.put(None)
+            self.executor = None
+        self.close_files()
     
     def add_data(self, features_dict):
         self.data_queue.put(features_dict)
+    
+    def end_of_stream(self):
+        # Sentinela: o consumidor encerra após processar o que já está na fila
+        self.data_queue.put(None)
+    
+    def add_data_chunk(self, samples):
+        # Enfileira várias amostras de uma vez (um único item na fila)
+        self.data_queue.put(list(samples))
+    
+    def add_data_batch(self, features, true_labels=None):
+        # Enfileira uma fatia (N, F) já normalizada, sem conversão para dicionários
+        self.data_queue.put(FeatureBatch(features, true_labels))
 
-def simulate_network_data(csv_file, detector, monitor, delay=1.0):
+def simulate_network_data(csv_file, detector, monitor, delay=1.0, batch_size=1):
     message = f"Carregando dados de simulação: {csv_file}"
     monitor.save_result(message)
     df = pd.read_csv(csv_file)
@@ -417,38 +1040,68 @@ def simulate_network_data(csv_file, detector, monitor, delay=1.0):
     message = f"Iniciando simulação com {len(df)} amostras..."
     monitor.save_result(message)
     
-    has_labels = 'label' in df.columns
+    true_labels = None
+    if 'label' in df.columns:
+        # Determinar se o rótulo indica ataque (1) ou normal (0)
+        is_benign = df['label'].astype(str).str.lower().isin(BENIGN_LABELS)
+        true_labels = (~is_benign).astype(int).tolist()
+        df = df.drop(columns=['label'])
     
-    for idx, row in df.iterrows():
-        if has_labels:
-            # Determinar se o rótulo indica ataque (1) ou normal (0)
-            label_value = row['label']
-            is_attack = 1
-            if isinstance(label_value, str) and label_value.lower() in ['benigntraffic', 'benign', 'normal']:
-                is_attack = 0
-            
-            features_dict = row.drop('label').to_dict()
-            monitor.add_data((features_dict, is_attack))
-            monitor.true_labels.append(is_attack)
-        else:
-            features_dict = row.to_dict()
-            monitor.add_data(features_dict)
+    # Layout SoA: uma única matriz float32 contígua na ordem das features do modelo,
+    # normalizada de uma vez para toda a simulação
+    features = np.ascontiguousarray(
+        df.reindex(columns=detector.feature_names, fill_value=0.0).to_numpy(dtype=np.float32)
+    )
+    detector.standardize(features)
+    total = len(features)
+    
+    # Com delay as amostras chegam uma a uma; sem delay são enviadas em lotes
+    chunk_size = 1 if delay > 0 else batch_size
+    next_deadline = time.perf_counter()
+    
+    for start in range(0, total, chunk_size):
+        end = min(start + chunk_size, total)
+        monitor.add_data_batch(
+            features[start:end],
+            true_labels[start:end] if true_labels is not None else None
+        )
         
-        if (idx + 1) % 100 == 0:
+        if end // 100 > start // 100:
             stats = detector.get_statistics()
-            progress_msg = f"\nProcessadas {idx + 1} amostras"
+            progress_msg = f"\nProcessadas {end} amostras"
             monitor.save_result(progress_msg)
             monitor.save_result(f"Taxa de ataques: {stats.get('attack_rate', 0):.3f}")
             monitor.save_result(f"Tempo médio: {stats.get('avg_inference_time_ms', 0):.2f} ms")
         
-        time.sleep(delay)
+        if delay > 0:
+            # Prazo absoluto: o overhead do laço não se acumula sobre o delay
+            next_deadline += delay
+            slack = next_deadline - time.perf_counter()
+            if slack > 0:
+                time.sleep(slack)
+
+def _exit_on_sigterm(signum, frame):
+    # SIGTERM (timeout/kill dos scripts) vira SystemExit: os blocos finally e o
+    # atexit rodam, descarregando e fechando os arquivos de saída
+    sys.exit(128 + signum)
 
 def main():
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    
     parser = argparse.ArgumentParser(description='Detector de Ataques de Rede em Tempo Real')
     parser.add_argument('--model', default='network_attack_detector_quantized.onnx', help='Modelo ONNX')
     parser.add_argument('--metadata', default='model_metadata.pkl', help='Metadados do modelo')
     parser.add_argument('--simulate', type=str, help='Arquivo CSV para simulação')
     parser.add_argument('--delay', type=float, default=0.1, help='Delay entre amostras (segundos)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Tamanho máximo do lote de inferência (padrão 1: uma amostra por inferência). '
+                             'Lotes maiores aumentam o throughput, mas o modelo quantiza as ativações com '
+                             'uma escala por lote, então a classe prevista e o veredito de uma amostra '
+                             'podem depender das demais amostras do lote')
+    parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu',
+                        help='Dispositivo de inferência (cuda requer onnxruntime-gpu)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Processos de inferência (0 = thread única com lotes; -1 = um por CPU)')
     parser.add_argument('--interactive', action='store_true', help='Modo interativo')
     parser.add_argument('--benchmark', action='store_true', help='Benchmark de performance')
     parser.add_argument('--output', type=str, help='Arquivo de saída personalizado')
@@ -465,8 +1118,9 @@ def main():
         print(f"Resultados serão salvos em: {result_file}")
     
     try:
-        detector = NetworkAttackDetector(args.model, args.metadata)
-        monitor = RealTimeMonitor(detector, result_file=result_file)
+        detector = NetworkAttackDetector(args.model, args.metadata, batch_size=args.batch_size, device=args.device)
+        workers = os.cpu_count() if args.workers < 0 else args.workers
+        monitor = RealTimeMonitor(detector, result_file=result_file, batch_size=args.batch_size, workers=workers)
     except Exception as e:
         print(f"Erro ao inicializar detector: {e}")
         sys.exit(1)
@@ -474,15 +1128,23 @@ def main():
     if args.benchmark:
         print("Executando benchmark...")
         
-        test_features = {name: np.random.randn() for name in detector.feature_names}
+        # Matriz (N, F) gerada de uma vez e normalizada uma única vez, sem dicionários
+        test_features = np.random.randn(1000, len(detector.feature_names)).astype(np.float32)
+        detector.standardize(test_features)
         
-        for i in range(1000):
-            detector.predict(test_features)
+        # Reinicia a janela do psutil: a primeira leitura não deve cobrir carga e warm-up
+        psutil.cpu_percent()
+        detector.predict_prescaled_batch(test_features, return_results=False)
         
         stats = detector.get_statistics()
         print(f"\nResultados do benchmark:")
         print(f"Predições: {stats['total_predictions']}")
-        print(f"Tempo médio: {stats['avg_inference_time_ms']:.2f} ms")
+        if detector.batch_size > 1:
+            # Tempo por amostra amortizado no lote: não comparável ao de uma amostra isolada
+            print(f"Tempo médio por amostra (média em lotes de {detector.batch_size}): "
+                  f"{stats['avg_inference_time_ms']:.2f} ms")
+        else:
+            print(f"Tempo médio: {stats['avg_inference_time_ms']:.2f} ms")
         print(f"Throughput: {stats['throughput_per_second']:.2f} predições/segundo")
         print(f"Uso médio de CPU: {stats['avg_cpu_usage']:.2f}%")
         print(f"Uso médio de memória: {stats['avg_memory_usage']:.2f}%")
@@ -491,9 +1153,10 @@ def main():
         monitor_thread = monitor.start_monitoring()
         
         try:
-            simulate_network_data(args.simulate, detector, monitor, args.delay)
+            simulate_network_data(args.simulate, detector, monitor, args.delay, args.batch_size)
             
-            monitor.data_queue.join()
+            monitor.end_of_stream()
+            monitor_thread.join()
             
         except KeyboardInterrupt:
             monitor.save_result("Interrompido pelo usuário")